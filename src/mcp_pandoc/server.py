@@ -6,35 +6,744 @@ from mcp.server import NotificationOptions, Server
 import mcp.server.stdio
 import os
 import asyncio
+import base64
+import functools
+import hashlib
+import mimetypes
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Final
+from concurrent.futures import ProcessPoolExecutor
+import aiohttp
 from aiohttp import web
 import logging
-from urllib.parse import urlparse
+import re
+from urllib.parse import quote, urlparse
 
 server = Server("mcp-pandoc")
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("mcp-pandoc-server")
 
-SHARED_DOWNLOAD_INTERNAL_PATH = os.environ.get("MCP_PANDOC_SHARED_DIR", "/app/shared_downloads")
-DOWNLOAD_BASE_URL = os.environ.get("MCP_PANDOC_DOWNLOAD_BASE_URL", "http://localhost:8081/downloads")
-HTTP_SERVER_PORT = int(os.environ.get("MCP_PANDOC_HTTP_PORT", 8081))
 
-# Ensure the shared download directory exists
-os.makedirs(SHARED_DOWNLOAD_INTERNAL_PATH, exist_ok=True)
-logger.info(f"MCP Pandoc Server starting up...")
-logger.info(f"Using DOWNLOAD_BASE_URL: {DOWNLOAD_BASE_URL}")
-logger.info(f"Serving files from internal path: {SHARED_DOWNLOAD_INTERNAL_PATH} on port {HTTP_SERVER_PORT}")
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Server settings, read from the environment once at import."""
+    shared_dir: str  # without a trailing separator, so paths can be built with a plain f-string
+    download_base: str  # MCP_PANDOC_DOWNLOAD_BASE_URL without a trailing '/'
+    port: int
+    prefix: str  # route prefix the download server must use so links resolve, '' when the URL has no path
+    max_input_bytes: int
+    max_concurrency: int
+    workers: int
+    file_ttl_seconds: int  # files this server wrote are removed once older than this; <= 0 disables it
+    inline_limit_bytes: int  # larger string-mode results are saved and returned as a download link
+    cache_size: int  # number of conversion results kept in the LRU cache
+    pandoc_server_port: int
+
+
+def _load_config():
+    download_base = os.environ.get("MCP_PANDOC_DOWNLOAD_BASE_URL", "http://localhost:8081/downloads").rstrip('/')
+    max_concurrency = int(os.environ.get("MCP_PANDOC_MAX_CONCURRENCY", os.cpu_count() or 2))
+    return Config(
+        shared_dir=os.environ.get("MCP_PANDOC_SHARED_DIR", "/app/shared_downloads").rstrip(os.sep) or os.sep,
+        download_base=download_base,
+        port=int(os.environ.get("MCP_PANDOC_HTTP_PORT", 8081)),
+        # Example: "http://172.191.18.52:8087/downloads" is served under "/downloads"
+        prefix=urlparse(download_base).path.rstrip('/'),
+        max_input_bytes=int(os.environ.get("MCP_PANDOC_MAX_INPUT_BYTES", 16 * 1024 * 1024)),
+        max_concurrency=max_concurrency,
+        workers=int(os.environ.get("MCP_PANDOC_WORKERS", max_concurrency)),
+        file_ttl_seconds=int(os.environ.get("MCP_PANDOC_TTL_SECONDS", 3600)),
+        inline_limit_bytes=int(os.environ.get("MCP_PANDOC_INLINE_LIMIT_BYTES", 256 * 1024)),
+        cache_size=int(os.environ.get("MCP_PANDOC_CACHE_SIZE", 256)),
+        pandoc_server_port=int(os.environ.get("MCP_PANDOC_SERVER_PORT", 3030)),
+    )
+
+
+_CFG = _load_config()
+
+# pandoc runs as a subprocess and can take seconds (xelatex for PDF), so file-to-string conversions,
+# which wait on pandoc with a blocking call, are dispatched to a process pool to keep the event loop
+# free for the HTTP server and other RPCs.
+# Worker processes also keep a crashing conversion from taking the server down with it.
+_POOL = ProcessPoolExecutor(max_workers=_CFG.workers)
+# Caps the number of pandoc processes alive at once (a xelatex run easily takes a core and
+# hundreds of MB); excess conversions queue here instead of forking.
+_CONVERT_SEM = asyncio.Semaphore(_CFG.max_concurrency)
+
+# String-mode conversions arriving within a short window are coalesced into one pandoc run.
+# Documents are joined with an HTML comment that pandoc passes through untouched for html output,
+# and the rendered result is split back on it. (markdown to markdown never gets here: same-format
+# conversions return the contents unchanged.)
+_BATCH_WINDOW_SECONDS = 0.01
+_BATCH_SENTINEL = "<!--CD985272F78311-->"
+_BATCH_SEPARATOR = f"\n\n{_BATCH_SENTINEL}\n\n"
+_BATCH_SPLIT = re.compile(r"\s*" + re.escape(_BATCH_SENTINEL) + r"\s*")
+_BATCHABLE_OUTPUT_FORMATS = {"html"}
+# Headings (auto identifiers are de-duplicated per document), reference/footnote definitions,
+# metadata and title blocks, inline notes (numbered and collected at the end of the whole input),
+# example lists (numbered across the input) and LaTeX macro definitions have document-wide
+# effects, so contents containing them are converted alone. So are contents with an HTML comment:
+# an unclosed "<!--" would run across blank lines and be closed by the next separator.
+_BATCH_UNSAFE = re.compile(
+    r"^ {0,3}(#{1,6}(\s|$)|\[[^\]]+\]:|[=-]+\s*$)|^%|\^\[|\(@[\w-]*\)|\\(re)?newcommand|<!--",
+    re.MULTILINE)
+_batch_queue: asyncio.Queue | None = None
+# asyncio keeps only weak references to tasks, so in-flight batches are held here until they finish.
+_batch_tasks: set[asyncio.Task] = set()
+
+# Read size used by FileResponse when sendfile() is unavailable (e.g. Windows); larger than
+# aiohttp's 256 KiB default to cut read/write syscalls for big PDF/DOCX downloads.
+_DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Files in _CFG.shared_dir are served at <protocol>://<host>:<port><prefix>/<filename>, matching the
+# structure of DOWNLOAD_BASE_URL. One segment only, so nested paths are rejected by the router.
+_DOWNLOAD_ROUTE = f"{_CFG.prefix}/{{name:[^/]+}}"
+
+# Recent conversions keyed by a hash of the source and the conversion parameters, so repeated
+# requests skip pandoc entirely. String-mode entries hold the converted text; file-mode entries
+# hold a private copy under _CACHE_DIR that is hard-linked to the requested filename on a hit.
+# Text larger than inline_limit_bytes is not cached, which keeps the in-memory part below
+# cache_size * inline_limit_bytes.
+_CACHE_DIR = os.path.join(_CFG.shared_dir, ".cache")
+_conversion_cache: OrderedDict[str, tuple[bool, str]] = OrderedDict()
+
+# The shared directory is user-configurable and may hold files this server did not write, so the
+# sweeper only removes output files written by this process and names it generates itself:
+# spill files, temporary files and cache artifacts.
+_owned_outputs: set[str] = set()
+_GENERATED_NAME = re.compile(r"converted-[0-9a-f]{12}\..+|\.[0-9a-f]{12}\.tmp(\..+)?")
+_CACHE_ARTIFACT_NAME = re.compile(r"[0-9a-f]{128}(\..+)?")
+
+# A long-running `pandoc server` (pandoc >= 3.0) avoids pandoc's per-call process startup for
+# content conversions. Anything it cannot handle falls back to a pandoc subprocess: PDF needs an
+# external engine, and docx/epub embed local images, which the server cannot read (it has no file
+# access, so it swaps each image for its alt text and still answers 200).
+_PANDOC_SERVER_URL = f"http://127.0.0.1:{_CFG.pandoc_server_port}/"
+_PANDOC_SERVER_OUTPUT_FORMATS = {"html", "markdown", "rst", "latex"}
+# Packaged formats; a string can never already be one, so same-format conversions still run pandoc.
+_BINARY_OUTPUT_FORMATS = {"docx", "epub"}
+_pandoc_server_proc: asyncio.subprocess.Process | None = None
+_pandoc_session: aiohttp.ClientSession | None = None
+
+# A bare filename: no separators or control characters, and not "." or "..".
+_SAFE_FILENAME = re.compile(r"(?!\.\.?$)[^\x00-\x1f/\\:]+")
+
+_ADVANCED_FORMATS: Final = frozenset({"pdf", "docx", "rst", "latex", "epub"})
+
+# For PDF conversion, especially with CJK characters, xelatex is better.
+# Ensure fonts are installed in the Docker image (e.g., Noto Sans CJK or other Chinese fonts)
+_PDF_EXTRA_ARGS = (
+    "--pdf-engine=xelatex",
+    "-V", "geometry:margin=1in",
+    # Example: If you have a main CJK font installed and know its name
+    # "-V", "mainfont=Noto Sans CJK SC" # Or your specific font
+    # "-V", "monofont=Noto Sans Mono CJK SC"
+    # "-V", "sansfont=Noto Sans CJK SC"
+)
+
+# Extra pandoc arguments by output format, looked up once per call.
+_EXTRA_ARGS: dict[str, tuple[str, ...]] = {"pdf": _PDF_EXTRA_ARGS}
+
+# File extensions for formats whose name is not their usual extension.
+_FILE_EXTENSIONS = {"markdown": "md", "latex": "tex"}
+
+# Text input formats by file extension. Input files whose extension agrees with input_format are
+# fed to pandoc over stdin from the bytes already read for the cache key, instead of pandoc
+# opening the file again; anything else keeps extension-based format detection.
+_TEXT_INPUT_EXTENSIONS = {
+    ".md": "markdown", ".markdown": "markdown",
+    ".html": "html", ".htm": "html",
+    ".rst": "rst",
+    ".tex": "latex",
+}
+
+# Tool format names that differ from pandoc's writer names. pandoc < 3 has no pdf writer: like
+# pypandoc, PDF is requested as latex and the .pdf output path makes pandoc run the PDF engine.
+_PANDOC_OUTPUT_FORMATS = {"txt": "plain", "pdf": "latex"}
 
 
 async def start_http_server(app_runner):
     """Starts the aiohttp server."""
+    # Ensure the shared download directory exists; done here rather than at import so a slow
+    # (e.g. NFS) shared directory does not stall importing the module.
+    await asyncio.to_thread(os.makedirs, _CFG.shared_dir, exist_ok=True)
     await app_runner.setup()
-    site = web.TCPSite(app_runner, '0.0.0.0', HTTP_SERVER_PORT)  # Listen on all interfaces inside container
+    site = web.TCPSite(app_runner, '0.0.0.0', _CFG.port)  # Listen on all interfaces inside container
     await site.start()
-    logger.info(f"HTTP server started on 0.0.0.0:{HTTP_SERVER_PORT}, serving static files.")
+    logger.info("HTTP server started on 0.0.0.0:%s, serving static files.", _CFG.port)
     # This log message is crucial for debugging the download link construction
-    logger.info(f"Download links will be based on (DOWNLOAD_BASE_URL): {DOWNLOAD_BASE_URL}")
-    logger.info(f"Files are served from internal path: {SHARED_DOWNLOAD_INTERNAL_PATH}")
+    logger.info("Download links will be based on (DOWNLOAD_BASE_URL): %s", _CFG.download_base)
+    logger.info("Files are served from internal path: %s", _CFG.shared_dir)
+    # aiohttp's FileResponse uses loop.sendfile() unless the platform lacks it or AIOHTTP_NOSENDFILE is set.
+    # Loops that only inherit AbstractEventLoop's stub (uvloop) make it fall back to chunked reads.
+    loop_has_sendfile = type(asyncio.get_running_loop()).sendfile is not asyncio.AbstractEventLoop.sendfile
+    if loop_has_sendfile and hasattr(os, "sendfile") and not os.environ.get("AIOHTTP_NOSENDFILE"):
+        logger.info("Downloads are sent with zero-copy sendfile().")
+    else:
+        logger.info("sendfile() unavailable; downloads are streamed in %s byte chunks.", _DOWNLOAD_CHUNK_SIZE)
+
+
+def _is_batchable(contents, input_format, output_format):
+    """Whether a string-mode conversion can share a pandoc run with others."""
+    return (
+        input_format == "markdown"
+        and output_format in _BATCHABLE_OUTPUT_FORMATS
+        and not _BATCH_UNSAFE.search(contents)
+    )
+
+
+async def _convert_text_batched(contents, input_format, output_format):
+    """Queues a string-mode conversion for the batch coalescer and waits for its result."""
+    future = asyncio.get_running_loop().create_future()
+    await _batch_queue.put(((input_format, output_format), contents, future))
+    return await future
+
+
+async def _run_batch(key, items):
+    """Converts a group of queued documents sharing the same formats with a single pandoc call."""
+    input_format, output_format = key
+    try:
+        if len(items) > 1:
+            joined = _BATCH_SEPARATOR.join(contents for contents, _ in items)
+            converted = (await _pandoc_pipe(joined.encode("utf-8"), input_format, output_format)).decode("utf-8")
+            parts = _BATCH_SPLIT.split(converted)
+            if len(parts) == len(items):
+                logger.info("Converted a batch of %s documents with one pandoc call", len(items))
+                for (_, future), part in zip(items, parts):
+                    if not future.done():
+                        future.set_result(part.strip("\n") + "\n" if part.strip() else "")
+                return
+            logger.warning(
+                "Batched output split into %s parts for %s documents; converting individually",
+                len(parts), len(items))
+        for contents, future in items:
+            converted = (await _pandoc_pipe(contents.encode("utf-8"), input_format, output_format)).decode("utf-8")
+            if not future.done():
+                future.set_result(converted)
+    except Exception as e:
+        for _, future in items:
+            if not future.done():
+                future.set_exception(e)
+
+
+async def _batch_coalescer():
+    """Drains the batch queue, grouping requests that arrive within the batching window."""
+    while True:
+        pending = [await _batch_queue.get()]
+        await asyncio.sleep(_BATCH_WINDOW_SECONDS)
+        while not _batch_queue.empty():
+            pending.append(_batch_queue.get_nowait())
+        groups = {}
+        for key, contents, future in pending:
+            groups.setdefault(key, []).append((contents, future))
+        for key, items in groups.items():
+            task = asyncio.create_task(_run_batch(key, items))
+            _batch_tasks.add(task)
+            task.add_done_callback(_batch_tasks.discard)
+
+
+def _do_convert(input_file_path, output_format, extra_args=()):
+    """Runs pandoc on an input file in a pool worker and returns its stdout as bytes.
+
+    Top-level so it pickles by reference. As with pypandoc.convert_file, the input format
+    is inferred from the file extension; unlike it, the output is not decoded, so a result
+    too large for the reply can be saved without a decode/encode round trip.
+    """
+    result = subprocess.run(
+        [pypandoc.get_pandoc_path(), input_file_path, "-t", _pandoc_writer(output_format), *extra_args],
+        stdin=subprocess.DEVNULL, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(_pandoc_error(result.returncode, result.stderr))
+    return result.stdout
+
+
+def _pipeable_input_file(path, input_format):
+    """Whether an input file can be converted from its already-read bytes over stdin."""
+    return _TEXT_INPUT_EXTENSIONS.get(os.path.splitext(path)[1].lower()) == input_format
+
+
+def _utf8_len_exceeds(text, limit):
+    """Whether text encodes to more than limit UTF-8 bytes.
+
+    UTF-8 uses 1-4 bytes per character, so the string length bounds the encoded
+    size and only borderline strings need to be encoded to be measured.
+    """
+    if len(text) * 4 <= limit:
+        return False
+    return len(text) > limit or len(text.encode("utf-8")) > limit
+
+
+def _read_file_bytes(path):
+    """Reads a whole input file, hinting the kernel to read ahead aggressively.
+
+    This read happens before pandoc is spawned, so it also leaves the file in
+    the page cache for pandoc's own pass over it.
+    """
+    with open(path, "rb") as f:
+        if hasattr(os, "posix_fadvise"):
+            fd = f.fileno()
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        return f.read()
+
+
+def _cache_key(source, input_format, output_format, extra_args, to_file):
+    """Hashes the source bytes together with everything that affects pandoc's output."""
+    digest = hashlib.blake2b(source)
+    digest.update(repr((input_format, output_format, tuple(extra_args), to_file)).encode())
+    return digest.hexdigest()
+
+
+async def _cache_get(key):
+    """Returns the cached text or artifact path for key, or None on a miss.
+
+    The index is only touched on the event loop; checking that an artifact still exists
+    (the shared directory may be on NFS) happens in a thread.
+    """
+    entry = _conversion_cache.get(key)
+    if entry is None:
+        return None
+    is_file, value = entry
+    if is_file and not await asyncio.to_thread(os.path.exists, value):
+        if _conversion_cache.get(key) == entry:
+            del _conversion_cache[key]
+        return None
+    if key in _conversion_cache:
+        _conversion_cache.move_to_end(key)
+    return value
+
+
+def _unlink_all(paths):
+    for path in paths:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+async def _cache_put(key, value, is_file):
+    _conversion_cache[key] = (is_file, value)
+    _conversion_cache.move_to_end(key)
+    evicted_files = []
+    while len(_conversion_cache) > _CFG.cache_size:
+        _, (evicted_is_file, evicted) = _conversion_cache.popitem(last=False)
+        if evicted_is_file:
+            evicted_files.append(evicted)
+    if evicted_files:
+        await asyncio.to_thread(_unlink_all, evicted_files)
+
+
+def _tmp_sibling(path, ext=None):
+    """A unique hidden name in path's directory, ending in path's extension unless ext is given."""
+    head, tail = os.path.split(path)
+    ext = os.path.splitext(tail)[1] if ext is None else ext
+    return os.path.join(head, f".{uuid.uuid4().hex[:12]}.tmp{ext}")
+
+
+def _link_or_copy(src, dst):
+    """Makes dst a hard link to src, copying instead when linking is not possible (e.g. across devices).
+
+    dst is swapped in with os.replace, so it is never missing or partly copied.
+    """
+    tmp_path = _tmp_sibling(dst)
+    try:
+        try:
+            os.link(src, tmp_path)
+        except OSError:
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    finally:
+        _remove_if_exists(tmp_path)
+
+
+def _remove_if_exists(path):
+    if os.path.lexists(path):
+        os.unlink(path)
+
+
+def _materialize_cached(cached_path, path):
+    """Links a cached artifact to the requested output path, unless it is already linked there."""
+    try:
+        already_linked = os.path.samefile(cached_path, path)
+    except FileNotFoundError:
+        already_linked = False
+    if not already_linked:
+        _link_or_copy(cached_path, path)
+    # The link shares the cached inode's mtime; refresh it so the sweeper treats it as new.
+    os.utime(path)
+
+
+def _cache_artifact_path(key, path):
+    """The private cache path for a conversion to path, creating _CACHE_DIR if needed.
+
+    The writer links its output here before publishing it at path, so the cached copy is the
+    file this conversion produced even if a concurrent conversion to the same name replaces
+    path right after. The caller records it with _cache_put once the write has succeeded.
+    """
+    os.makedirs(_CACHE_DIR, exist_ok=True)
+    return os.path.join(_CACHE_DIR, key + os.path.splitext(path)[1])
+
+
+def _open_output_tmpfile(path):
+    """Opens an unnamed file in path's directory to be written and then linked to path.
+
+    Returns None where O_TMPFILE is unavailable (non-Linux, or a filesystem without
+    support); callers then write a hidden sibling file and rename it over path.
+    """
+    if not hasattr(os, "O_TMPFILE"):
+        return None
+    try:
+        return os.open(os.path.dirname(path) or ".", os.O_TMPFILE | os.O_RDWR, 0o666)
+    except OSError:
+        return None
+
+
+def _link_output_tmpfile(fd, path):
+    """Gives the unnamed file behind fd the name path, replacing any file already there."""
+    proc_path = f"/proc/self/fd/{fd}"
+    try:
+        os.link(proc_path, path)
+        return
+    except OSError:
+        pass  # the name is taken (EEXIST), or linking through /proc is refused (EXDEV in some sandboxes)
+    # Publish under a unique name first, then swap it in atomically.
+    tmp_path = _tmp_sibling(path)
+    try:
+        try:
+            os.link(proc_path, tmp_path)
+        except OSError:
+            with open(os.dup(fd), "rb") as src, open(tmp_path, "wb") as dst:
+                src.seek(0)  # the dup shares fd's offset, which may be at the end after writing
+                shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, path)
+    finally:
+        _remove_if_exists(tmp_path)
+
+
+def _publish_tmpfile(fd, path, cache_path=None):
+    """Links a finished unnamed file to cache_path (when given) and then to path."""
+    if cache_path:
+        _link_output_tmpfile(fd, cache_path)
+    _link_output_tmpfile(fd, path)
+
+
+def _publish_tmp_path(tmp_path, path, cache_path=None):
+    """Links a finished hidden sibling file to cache_path (when given) and renames it over path."""
+    if cache_path:
+        _link_or_copy(tmp_path, cache_path)
+    os.replace(tmp_path, path)
+
+
+def _write_output(path, data, cache_path=None):
+    """Writes text or bytes to path; readers see either the previous file or the complete new one.
+
+    With cache_path, the same file is also linked there before it appears at path.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    fd = _open_output_tmpfile(path)
+    if fd is not None:
+        try:
+            with open(fd, "wb", closefd=False) as f:
+                f.write(data)
+            _publish_tmpfile(fd, path, cache_path)
+        finally:
+            os.close(fd)
+        return
+    tmp_path = _tmp_sibling(path)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        _publish_tmp_path(tmp_path, path, cache_path)
+    finally:
+        _remove_if_exists(tmp_path)
+
+
+def _pandoc_error(returncode, stderr):
+    return f'Pandoc died with exitcode "{returncode}" during conversion: {stderr.decode("utf-8", errors="replace")}'
+
+
+async def _run_pandoc(argv, contents=None, outputfile=None, pdf=False, cache_path=None):
+    """Runs pandoc with argv under _CONVERT_SEM and returns its stdout (None when it writes a file).
+
+    For pdf, pandoc always writes to a path ending in .pdf, whatever outputfile is named.
+
+    A file output is written into an O_TMPFILE in the target directory (or, without O_TMPFILE,
+    a hidden sibling file) and put in place only once pandoc succeeds. Concurrent writers never
+    truncate each other, a download never sees a half-written file, and a failed run leaves
+    the previous file untouched. With cache_path, the output is linked there first.
+    """
+    tmp_fd = None
+    tmp_path = None
+    if outputfile and outputfile != "-":
+        # pandoc runs the PDF engine only for a .pdf output path, which /proc/self/fd/N is not.
+        if not pdf:
+            tmp_fd = await asyncio.to_thread(_open_output_tmpfile, outputfile)
+        if tmp_fd is None:
+            tmp_path = _tmp_sibling(outputfile, ".pdf" if pdf else None)
+        argv = [*argv, "-o", tmp_path or f"/proc/self/fd/{tmp_fd}"]
+    elif outputfile:
+        argv = [*argv, "-o", outputfile]
+    try:
+        async with _CONVERT_SEM:
+            proc = await asyncio.create_subprocess_exec(
+                *argv,
+                stdin=asyncio.subprocess.DEVNULL if contents is None else asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE if outputfile in (None, "-") else asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+                pass_fds=() if tmp_fd is None else (tmp_fd,),
+            )
+            stdout, stderr = await proc.communicate(contents)
+        if proc.returncode != 0:
+            raise RuntimeError(_pandoc_error(proc.returncode, stderr))
+        if tmp_fd is not None:
+            await asyncio.to_thread(_publish_tmpfile, tmp_fd, outputfile, cache_path)
+        elif tmp_path is not None:
+            await asyncio.to_thread(_publish_tmp_path, tmp_path, outputfile, cache_path)
+    finally:
+        if tmp_fd is not None:
+            os.close(tmp_fd)
+        if tmp_path is not None:
+            await asyncio.to_thread(_remove_if_exists, tmp_path)
+    return stdout
+
+
+def _pandoc_writer(output_format):
+    """pandoc's -t writer for a tool output format; shared by every pandoc invocation."""
+    return _PANDOC_OUTPUT_FORMATS.get(output_format, output_format)
+
+
+async def _pandoc_pipe(contents, input_format, output_format, outputfile=None, extra_args=(), cache_path=None):
+    """Runs pandoc with contents (bytes) on stdin and returns its stdout.
+
+    Feeding stdin directly avoids pypandoc's temp-file round trip and lets the
+    wait happen on the event loop instead of a blocking call.
+    """
+    argv = [
+        pypandoc.get_pandoc_path(),
+        "-f", input_format,
+        "-t", _pandoc_writer(output_format),
+        *extra_args,
+    ]
+    return await _run_pandoc(
+        argv, contents=contents, outputfile=outputfile, pdf=output_format == "pdf", cache_path=cache_path)
+
+
+async def _pandoc_file_to_file(input_file_path, output_format, outputfile, extra_args=(), cache_path=None):
+    """Runs pandoc on an input file, writing straight to outputfile ('-' returns stdout instead).
+
+    Only stderr is captured, and the input format is left for pandoc to infer
+    from the file extension, as pypandoc.convert_file did. PDF is handled as in
+    _pandoc_pipe.
+    """
+    argv = [
+        pypandoc.get_pandoc_path(),
+        input_file_path,
+        "-t", _pandoc_writer(output_format),
+        *extra_args,
+    ]
+    return await _run_pandoc(argv, outputfile=outputfile, pdf=output_format == "pdf", cache_path=cache_path)
+
+
+async def _convert_to_bytes(source, input_file_path, input_format, output_format, extra_args):
+    """Converts for an inline reply and returns the output document.
+
+    pandoc cannot write PDF to stdout, so PDF goes through a .pdf file in a private
+    temporary directory. Input files that cannot be piped are passed by path, as in
+    the non-inline paths.
+    """
+    tmp_dir = None
+    outputfile = "-"
+    if output_format == "pdf":
+        tmp_dir = await asyncio.to_thread(tempfile.mkdtemp, prefix="mcp-pandoc-")
+        outputfile = os.path.join(tmp_dir, "converted.pdf")
+    try:
+        if input_file_path and not _pipeable_input_file(input_file_path, input_format):
+            output = await _pandoc_file_to_file(input_file_path, output_format, outputfile, extra_args=extra_args)
+        else:
+            output = await _pandoc_pipe(source, input_format, output_format, outputfile=outputfile, extra_args=extra_args)
+        if tmp_dir is not None:
+            output = await asyncio.to_thread(_read_file_bytes, outputfile)
+        return output
+    finally:
+        if tmp_dir is not None:
+            await asyncio.to_thread(shutil.rmtree, tmp_dir, True)
+
+
+async def start_pandoc_server():
+    """Spawns `pandoc server` and the shared client session used to talk to it."""
+    global _pandoc_server_proc, _pandoc_session
+    # Distributions that build the server separately ship it as a `pandoc-server` executable.
+    pandoc_server_path = shutil.which("pandoc-server")
+    try:
+        argv = [pandoc_server_path] if pandoc_server_path else [pypandoc.get_pandoc_path(), "server"]
+        _pandoc_server_proc = await asyncio.create_subprocess_exec(
+            *argv, "--port", str(_CFG.pandoc_server_port),
+            # stdin/stdout belong to the MCP stdio transport
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+    except OSError as e:
+        logger.warning("Could not start pandoc server, conversions will run pandoc per call: %s", e)
+        return
+    _pandoc_session = aiohttp.ClientSession()
+    if not await _wait_for_pandoc_server():
+        # pandoc < 3.0 has no server mode and exits straight away with a usage error.
+        logger.warning(
+            "pandoc server did not respond on %s (server mode needs pandoc >= 3.0), "
+            "conversions will run pandoc per call.", _PANDOC_SERVER_URL)
+        await stop_pandoc_server()
+        return
+    logger.info("pandoc server started on %s (pid %s)", _PANDOC_SERVER_URL, _pandoc_server_proc.pid)
+
+
+async def _wait_for_pandoc_server(attempts=20, delay=0.1):
+    """Polls GET /version until the pandoc server answers; False if it exits or never does."""
+    for _ in range(attempts):
+        if _pandoc_server_proc.returncode is not None:
+            return False
+        try:
+            async with _pandoc_session.get(f"{_PANDOC_SERVER_URL}version") as response:
+                if response.status == 200:
+                    return True
+        except aiohttp.ClientError:
+            pass  # not listening yet
+        await asyncio.sleep(delay)
+    return False
+
+
+async def stop_pandoc_server():
+    """Closes the client session and terminates the pandoc server subprocess."""
+    global _pandoc_server_proc, _pandoc_session
+    if _pandoc_session is not None:
+        await _pandoc_session.close()
+        _pandoc_session = None
+    if _pandoc_server_proc is not None and _pandoc_server_proc.returncode is None:
+        _pandoc_server_proc.terminate()
+        await _pandoc_server_proc.wait()
+    _pandoc_server_proc = None
+
+
+async def _convert_via_pandoc_server(contents, input_format, output_format):
+    """Converts text through the pandoc server; returns None when the caller should fall back."""
+    if (
+        _pandoc_session is None
+        or _pandoc_server_proc is None
+        or _pandoc_server_proc.returncode is not None
+        or output_format not in _PANDOC_SERVER_OUTPUT_FORMATS
+    ):
+        return None
+    payload = {
+        "text": contents,
+        "from": input_format,
+        "to": output_format,
+    }
+    try:
+        async with _pandoc_session.post(
+                _PANDOC_SERVER_URL, json=payload, headers={"Accept": "application/json"}
+        ) as response:
+            if response.status != 200:
+                logger.warning(
+                    "pandoc server returned HTTP %s, falling back to a pandoc subprocess: %s",
+                    response.status, await response.text())
+                return None
+            result = await response.json()
+    except aiohttp.ClientError as e:
+        logger.warning("pandoc server request failed, falling back to a pandoc subprocess: %s", e)
+        return None
+    return result["output"]
+
+
+def _resolve_download(name):
+    """Returns the real path of a downloadable file, or None if it is missing or resolves outside the shared directory."""
+    shared_dir = os.path.realpath(_CFG.shared_dir)
+    path = os.path.realpath(os.path.join(shared_dir, name))
+    if os.path.dirname(path) != shared_dir or not os.path.isfile(path):
+        return None
+    return path
+
+
+async def serve_download(request):
+    """Serves a converted file from the shared download directory.
+
+    FileResponse hands the file to the kernel with sendfile() where available,
+    avoiding the user-space read/write copy loop, and otherwise streams it in
+    _DOWNLOAD_CHUNK_SIZE reads with a known Content-Length.
+    """
+    name = request.match_info["name"]
+    if name in (".", "..") or os.sep in name:
+        raise web.HTTPNotFound()
+    path = await asyncio.to_thread(_resolve_download, name)
+    if path is None:
+        raise web.HTTPNotFound()
+    return web.FileResponse(path, chunk_size=_DOWNLOAD_CHUNK_SIZE)
+
+
+def _sweep_shared_dir(owned):
+    """Deletes files this server wrote whose mtime is older than _CFG.file_ttl_seconds.
+
+    Only paths in owned and generated names (see _GENERATED_NAME) are considered; other files
+    in the shared directory are left alone. Cache artifacts are swept too: the in-memory index
+    starts empty after a restart, so files left in _CACHE_DIR by an earlier process would
+    otherwise never be evicted. Cache hits touch the artifact's inode, so entries that are
+    still in use stay fresh; _cache_get drops entries whose file has been swept.
+
+    Returns the removed paths.
+    """
+    cutoff = time.time() - _CFG.file_ttl_seconds
+    removed = []
+    for directory, generated in ((_CFG.shared_dir, _GENERATED_NAME), (_CACHE_DIR, _CACHE_ARTIFACT_NAME)):
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue  # no cache directory until the first file conversion
+        with entries:
+            for entry in entries:
+                if not (generated.fullmatch(entry.name) or entry.path in owned):
+                    continue
+                try:
+                    if entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                        os.unlink(entry.path)
+                        removed.append(entry.path)
+                except OSError:
+                    pass  # raced with a download, a cache relink or another sweep
+    return removed
+
+
+async def _gc_loop():
+    """Periodically sweeps expired files out of the shared directory."""
+    if _CFG.file_ttl_seconds <= 0:
+        logger.info("MCP_PANDOC_TTL_SECONDS is %s; converted files are kept indefinitely.", _CFG.file_ttl_seconds)
+        return
+    while True:
+        await asyncio.sleep(min(_CFG.file_ttl_seconds, 300))
+        try:
+            removed = await asyncio.to_thread(_sweep_shared_dir, frozenset(_owned_outputs))
+        except OSError as e:
+            logger.warning("Sweeping %s failed: %s", _CFG.shared_dir, e)
+            continue
+        _owned_outputs.difference_update(removed)
+        if removed:
+            logger.info("Removed %s expired files from %s", len(removed), _CFG.shared_dir)
+
+
+def _link_lifetime():
+    """Tells clients how long a download link works, matching what the sweeper does."""
+    ttl = _CFG.file_ttl_seconds
+    if ttl <= 0:
+        return "The link does not expire."
+    for unit, seconds in (("hour", 3600), ("minute", 60), ("second", 1)):
+        if ttl % seconds == 0:
+            count = ttl // seconds
+            return f"The link stays valid for {count} {unit}{'' if count == 1 else 's'}; the file is deleted after that."
 
 
 async def cleanup_http_server(app_runner):
@@ -43,114 +752,175 @@ async def cleanup_http_server(app_runner):
     logger.info("HTTP server stopped.")
 
 
+_DESCRIPTION: Final[str] = (
+    "Converts content between different formats. Transforms input content from any supported format "
+    "into the specified output format.\n\n"
+    "🚨 CRITICAL REQUIREMENTS - PLEASE READ:\n"
+    "1. PDF Conversion:\n"
+    "   * You MUST install TeX Live BEFORE attempting PDF conversion:\n"
+    "   * Ubuntu/Debian: `sudo apt-get install texlive-xetex texlive-fonts-recommended texlive-lang-chinese` (added Chinese support for TeX)\n"
+    "   * macOS: `brew install texlive`\n"
+    "   * Windows: Install MiKTeX or TeX Live from https://miktex.org/ or https://tug.org/texlive/\n"
+    "   * PDF conversion will FAIL without this installation\n\n"
+    "2. File Paths - EXPLICIT REQUIREMENTS:\n"
+    "   * When asked to save or convert to a file, you MUST provide:\n"
+    "     - Complete directory path (this will be used for the filename if unique names are desired)\n"
+    "     - Filename\n"
+    "     - File extension\n"
+    "   * Example request: 'Write a story and save as PDF as /output/story.pdf'\n"
+    "   * You MUST specify: '/path/to/story.pdf' or 'C:\\Documents\\story.pdf'. The filename part (e.g., 'story.pdf') will be used.\n"
+    "   * The tool will NOT automatically generate filenames or extensions\n\n"
+    "3. File Location After Conversion:\n"
+    "   * After successful conversion to a file, the tool will display the exact path where the file is saved INTERNALLY "
+    "     and provide a DOWNLOAD LINK.\n"
+    "   * Look for message: 'Content successfully converted. Download from: [download_link]'\n"
+    "   * You can use the provided link to download your converted file.\n"
+    f"   * {_link_lifetime()}\n"
+    "   * If no output path is specified (for basic formats), files are NOT saved and content is returned directly.\n"
+    "   * For better control and to get a download link, always provide explicit output file paths for advanced formats.\n\n"
+    "Supported formats:\n"
+    "- Basic formats (content returned directly if no output_file): txt, html, markdown\n"
+    "- Advanced formats (REQUIRE complete file paths, download link provided): pdf, docx, rst, latex, epub\n\n"
+    "✅ CORRECT Usage Examples:\n"
+    "1. 'Convert this text to HTML' (basic conversion)\n"
+    "   - Tool will show converted content\n\n"
+    "2. 'Save this text as PDF at /documents/story.pdf'\n"
+    "   - Correct: specifies path + filename + extension\n"
+    "   - Tool will show: 'Content successfully converted. Download from: [link_to_story.pdf]'\n\n"
+    "❌ INCORRECT Usage Examples:\n"
+    "1. 'Save this as PDF in /documents/' (for advanced formats)\n"
+    "   - Missing filename and extension\n"
+    "2. 'Convert to PDF' (for advanced formats)\n"
+    "   - Missing complete file path\n\n"
+    "When requesting conversion, ALWAYS specify:\n"
+    "1. The content or input file\n"
+    "2. The desired output format\n"
+    "3. For advanced formats (to get a download link): complete output path + filename + extension\n"
+    "Example: 'Convert this markdown to PDF and save as /path/to/output.pdf'\n\n"
+    "Note: After conversion, always check the success message for the download link or converted content."
+)
+
+# Arguments describing one conversion; also the shape of each entry in "inputs".
+_CONVERSION_PROPERTIES = {
+    "contents": {
+        "type": "string",
+        "description": "The content to be converted (required if input_file not provided)"
+    },
+    "input_file": {
+        "type": "string",
+        "description": "Complete path to input file including filename and extension (e.g., '/path/to/input.md')"
+    },
+    "input_format": {
+        "type": "string",
+        "description": "Source format of the content (defaults to markdown)",
+        "default": "markdown",
+        "enum": ["markdown", "html", "pdf", "docx", "rst", "latex", "epub", "txt"]
+    },
+    "output_format": {
+        "type": "string",
+        "description": "Desired output format (defaults to markdown)",
+        "default": "markdown",
+        "enum": ["markdown", "html", "pdf", "docx", "rst", "latex", "epub", "txt"]
+    },
+    "output_file": {
+        "type": "string",
+        "description": (
+            "Complete path where to save the output including filename and extension "
+            "(e.g., '/desired/path/output.pdf'). The filename part (e.g. 'output.pdf') "
+            "will be used for the downloadable file. Required for pdf, docx, rst, latex, epub formats."
+        )
+    },
+    "inline": {
+        "type": "boolean",
+        "description": (
+            "Return the converted document directly as an embedded base64 resource instead of saving it "
+            "and returning a download link. output_file is optional in this mode and only names the resource. "
+            "Documents too large to return directly are still saved and returned as a download link."
+        ),
+        "default": False
+    }
+}
+
+_TOOL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        **_CONVERSION_PROPERTIES,
+        "inputs": {
+            "type": "array",
+            "description": (
+                "Convert several documents in one call. Each entry takes the same arguments as a single "
+                "conversion; top-level arguments are used as defaults for every entry. The reply has one "
+                "line per entry with its download link, converted contents or error."
+            ),
+            "items": {"type": "object", "properties": _CONVERSION_PROPERTIES}
+        }
+    },
+    # "oneOf": [
+    #     {"required": ["contents"]},
+    #     {"required": ["input_file"]}
+    # ],
+    # "allOf": [
+    #     {
+    #         "if": {
+    #             "properties": {
+    #                 "output_format": {
+    #                     "enum": ["pdf", "docx", "rst", "latex", "epub"]
+    #                 }
+    #             }
+    #         },
+    #         "then": {
+    #             "required": ["output_file"]
+    #         }
+    #     }
+    # ]
+}
+
+# Per-argument (type, allowed values) compiled from _TOOL_SCHEMA, so arguments are checked in a
+# single pass and the schema stays the one place that lists the supported formats.
+_JSON_TYPES = {"string": str, "boolean": bool, "array": list}
+_ARGUMENT_RULES = {
+    key: (_JSON_TYPES[spec["type"]], frozenset(spec.get("enum", ())))
+    for key, spec in _TOOL_SCHEMA["properties"].items()
+}
+
+
+def _norm(value):
+    """Lowercases a format name, reusing the string when it is already lowercase (the usual case)."""
+    return value if value.islower() else value.lower()
+
+
+def _validate_arguments(arguments):
+    """Checks tool arguments against the types and format enums declared in _TOOL_SCHEMA.
+
+    JSON null is accepted for any argument; many clients send it for omitted optional fields.
+    """
+    for key, value in arguments.items():
+        rule = _ARGUMENT_RULES.get(key)
+        if rule is None or value is None:
+            continue
+        expected_type, allowed = rule
+        if not isinstance(value, expected_type):
+            raise ValueError(f"'{key}' must be of type {expected_type.__name__}")
+        if allowed and _norm(value) not in allowed:
+            raise ValueError(
+                f"Unsupported {key.replace('_', ' ')}: '{value}'. Supported formats are: {', '.join(sorted(allowed))}")
+
+
+# Built once at import; list_tools is called on every client handshake.
+_CONVERT_CONTENTS_TOOL = types.Tool(
+    name="convert-contents",
+    description=_DESCRIPTION,
+    inputSchema=_TOOL_SCHEMA,
+)
+
+
 @server.list_tools()
 async def handle_list_tools() -> list[types.Tool]:
     """
     List available tools.
     Each tool specifies its arguments using JSON Schema validation.
     """
-    return [
-        types.Tool(
-            name="convert-contents",
-            description=(
-                "Converts content between different formats. Transforms input content from any supported format "
-                "into the specified output format.\n\n"
-                "🚨 CRITICAL REQUIREMENTS - PLEASE READ:\n"
-                "1. PDF Conversion:\n"
-                "   * You MUST install TeX Live BEFORE attempting PDF conversion:\n"
-                "   * Ubuntu/Debian: `sudo apt-get install texlive-xetex texlive-fonts-recommended texlive-lang-chinese` (added Chinese support for TeX)\n"
-                "   * macOS: `brew install texlive`\n"
-                "   * Windows: Install MiKTeX or TeX Live from https://miktex.org/ or https://tug.org/texlive/\n"
-                "   * PDF conversion will FAIL without this installation\n\n"
-                "2. File Paths - EXPLICIT REQUIREMENTS:\n"
-                "   * When asked to save or convert to a file, you MUST provide:\n"
-                "     - Complete directory path (this will be used for the filename if unique names are desired)\n"
-                "     - Filename\n"
-                "     - File extension\n"
-                "   * Example request: 'Write a story and save as PDF as /output/story.pdf'\n"
-                "   * You MUST specify: '/path/to/story.pdf' or 'C:\\Documents\\story.pdf'. The filename part (e.g., 'story.pdf') will be used.\n"
-                "   * The tool will NOT automatically generate filenames or extensions\n\n"
-                "3. File Location After Conversion:\n"
-                "   * After successful conversion to a file, the tool will display the exact path where the file is saved INTERNALLY "
-                "     and provide a DOWNLOAD LINK.\n"
-                "   * Look for message: 'Content successfully converted. Download from: [download_link]'\n"
-                "   * You can use the provided link to download your converted file.\n"
-                "   * If no output path is specified (for basic formats), files are NOT saved and content is returned directly.\n"
-                "   * For better control and to get a download link, always provide explicit output file paths for advanced formats.\n\n"
-                "Supported formats:\n"
-                "- Basic formats (content returned directly if no output_file): txt, html, markdown\n"
-                "- Advanced formats (REQUIRE complete file paths, download link provided): pdf, docx, rst, latex, epub\n\n"
-                "✅ CORRECT Usage Examples:\n"
-                "1. 'Convert this text to HTML' (basic conversion)\n"
-                "   - Tool will show converted content\n\n"
-                "2. 'Save this text as PDF at /documents/story.pdf'\n"
-                "   - Correct: specifies path + filename + extension\n"
-                "   - Tool will show: 'Content successfully converted. Download from: [link_to_story.pdf]'\n\n"
-                "❌ INCORRECT Usage Examples:\n"
-                "1. 'Save this as PDF in /documents/' (for advanced formats)\n"
-                "   - Missing filename and extension\n"
-                "2. 'Convert to PDF' (for advanced formats)\n"
-                "   - Missing complete file path\n\n"
-                "When requesting conversion, ALWAYS specify:\n"
-                "1. The content or input file\n"
-                "2. The desired output format\n"
-                "3. For advanced formats (to get a download link): complete output path + filename + extension\n"
-                "Example: 'Convert this markdown to PDF and save as /path/to/output.pdf'\n\n"
-                "Note: After conversion, always check the success message for the download link or converted content."
-            ),
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "contents": {
-                        "type": "string",
-                        "description": "The content to be converted (required if input_file not provided)"
-                    },
-                    "input_file": {
-                        "type": "string",
-                        "description": "Complete path to input file including filename and extension (e.g., '/path/to/input.md')"
-                    },
-                    "input_format": {
-                        "type": "string",
-                        "description": "Source format of the content (defaults to markdown)",
-                        "default": "markdown",
-                        "enum": ["markdown", "html", "pdf", "docx", "rst", "latex", "epub", "txt"]
-                    },
-                    "output_format": {
-                        "type": "string",
-                        "description": "Desired output format (defaults to markdown)",
-                        "default": "markdown",
-                        "enum": ["markdown", "html", "pdf", "docx", "rst", "latex", "epub", "txt"]
-                    },
-                    "output_file": {
-                        "type": "string",
-                        "description": (
-                            "Complete path where to save the output including filename and extension "
-                            "(e.g., '/desired/path/output.pdf'). The filename part (e.g. 'output.pdf') "
-                            "will be used for the downloadable file. Required for pdf, docx, rst, latex, epub formats."
-                        )
-                    }
-                },
-                # "oneOf": [
-                #     {"required": ["contents"]},
-                #     {"required": ["input_file"]}
-                # ],
-                # "allOf": [
-                #     {
-                #         "if": {
-                #             "properties": {
-                #                 "output_format": {
-                #                     "enum": ["pdf", "docx", "rst", "latex", "epub"]
-                #                 }
-                #             }
-                #         },
-                #         "then": {
-                #             "required": ["output_file"]
-                #         }
-                #     }
-                # ]
-            }
-        )
-    ]
+    return [_CONVERT_CONTENTS_TOOL]
 
 
 @server.call_tool()
@@ -160,27 +930,85 @@ async def handle_call_tool(
     if name not in ["convert-contents"]:
         raise ValueError(f"Unknown tool: {name}")
 
-    logger.info(f"Received arguments for tool '{name}': {arguments}")
+    logger.info("Received arguments for tool '%s': %s", name, arguments)
 
     if not arguments:
         raise ValueError("Missing arguments")
 
+    if arguments.get("inputs") is None:
+        return await _convert_one(arguments)
+
+    _validate_arguments(arguments)
+    inputs = arguments["inputs"]
+    if not inputs or not all(isinstance(item, dict) for item in inputs):
+        raise ValueError("'inputs' must be a non-empty list of objects")
+
+    # Top-level arguments act as defaults for every item (a null in an item keeps the default).
+    # The conversions run concurrently; _CONVERT_SEM still caps how many pandoc processes are alive at once.
+    defaults = {key: value for key, value in arguments.items() if key != "inputs"}
+    results = await asyncio.gather(
+        *(_convert_one({**defaults, **{key: value for key, value in item.items() if value is not None}})
+          for item in inputs),
+        return_exceptions=True)
+
+    lines = []
+    resources = []
+    for index, result in enumerate(results, start=1):
+        if isinstance(result, BaseException):
+            lines.append(f"{index}. Failed: {result}")
+            continue
+        lines.append(f"{index}. " + "\n".join(item.text for item in result if isinstance(item, types.TextContent)))
+        resources.extend(item for item in result if isinstance(item, types.EmbeddedResource))
+    failed = sum(isinstance(result, BaseException) for result in results)
+    logger.info("Converted %s of %s inputs", len(results) - failed, len(results))
+    return [types.TextContent(type="text", text="\n\n".join(lines)), *resources]
+
+
+async def _save_for_download(output_bytes, output_format):
+    """Saves a result (bytes, or text to encode) too large for the reply under a generated name.
+
+    Returns the reply text with the download link.
+    """
+    if isinstance(output_bytes, str):
+        output_bytes = output_bytes.encode("utf-8")
+    spill_filename = f"converted-{uuid.uuid4().hex[:12]}.{_FILE_EXTENSIONS.get(output_format, output_format)}"
+    spill_path = f"{_CFG.shared_dir}{os.sep}{spill_filename}"
+    await asyncio.to_thread(_write_output, spill_path, output_bytes)
+    logger.info("Saved %s bytes of %s output to %s instead of returning it inline",
+                len(output_bytes), output_format, spill_path)
+    return (
+        f"Content successfully converted, but the {output_format} output ({len(output_bytes)} bytes) "
+        f"is too large to return directly. Download from: {_CFG.download_base}/{spill_filename}\n"
+        f"{_link_lifetime()}\n"
+        f"(Internally saved at: {spill_path})"
+    )
+
+
+async def _convert_one(
+        arguments: dict
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Runs a single conversion described by the tool arguments."""
+    _validate_arguments(arguments)
+
     contents = arguments.get("contents")
     input_file_path = arguments.get("input_file")
     user_specified_output_file = arguments.get("output_file")
-    output_format = arguments.get("output_format", "markdown").lower()
-    input_format = arguments.get("input_format", "markdown").lower()
+    output_format = _norm(arguments.get("output_format") or "markdown")
+    input_format = _norm(arguments.get("input_format") or "markdown")
+    inline = bool(arguments.get("inline", False))
 
     if not contents and not input_file_path:
         raise ValueError("Either 'contents' or 'input_file' must be provided")
+    if input_file_path and contents:
+        # The input file takes precedence, so the cache key and every conversion path use the file alone.
+        logger.info("Both contents and input_file were given; converting the input file")
+        contents = None
 
-    SUPPORTED_FORMATS = {'html', 'markdown', 'pdf', 'docx', 'rst', 'latex', 'epub', 'txt'}
-    if output_format not in SUPPORTED_FORMATS:
+    if contents and _utf8_len_exceeds(contents, _CFG.max_input_bytes):
         raise ValueError(
-            f"Unsupported output format: '{output_format}'. Supported formats are: {', '.join(SUPPORTED_FORMATS)}")
+            f"contents exceeds the maximum input size of {_CFG.max_input_bytes} bytes (MCP_PANDOC_MAX_INPUT_BYTES).")
 
-    ADVANCED_FORMATS = {'pdf', 'docx', 'rst', 'latex', 'epub'}
-    if output_format in ADVANCED_FORMATS and not user_specified_output_file:
+    if output_format in _ADVANCED_FORMATS and not user_specified_output_file and not inline:
         raise ValueError(f"output_file path is required for {output_format} format to enable download.")
 
     actual_output_path_in_container = None
@@ -189,101 +1017,190 @@ async def handle_call_tool(
 
     if user_specified_output_file:
         # Use only the filename part from the user's specified path.
-        # This filename is used for storage in SHARED_DOWNLOAD_INTERNAL_PATH and for the download link.
-        output_filename_for_url = os.path.basename(user_specified_output_file)
+        # This filename is used for storage in _CFG.shared_dir and for the download link.
+        # Split on both '/' and '\', so 'C:\Documents\story.pdf' also yields 'story.pdf'.
+        output_filename_for_url = user_specified_output_file.rsplit('/', 1)[-1].rsplit('\\', 1)[-1]
         if not output_filename_for_url:
             raise ValueError("output_file must include a filename and extension.")
 
-        # Ensure filename is safe for URL and filesystem (basic sanitation)
-        # For more robust sanitation, consider a library or more rules.
-        # This example primarily handles spaces by URL encoding later.
-        actual_output_path_in_container = os.path.join(SHARED_DOWNLOAD_INTERNAL_PATH, output_filename_for_url)
+        # Ensure filename is safe for the filesystem; this also rules out path traversal.
+        if not _SAFE_FILENAME.fullmatch(output_filename_for_url):
+            raise ValueError(f"output_file has an invalid filename: '{output_filename_for_url}'")
+        actual_output_path_in_container = f"{_CFG.shared_dir}{os.sep}{output_filename_for_url}"
 
-        # Construct download URL. The filename part will be URL-encoded by the browser/client if it contains spaces or special chars.
-        # The DOWNLOAD_BASE_URL should already contain the necessary prefix like /downloads
-        download_url = f"{DOWNLOAD_BASE_URL.rstrip('/')}/{output_filename_for_url}"
-        logger.info(f"User specified output file: {user_specified_output_file}")
-        logger.info(f"Derived output filename for URL/storage: {output_filename_for_url}")
-        logger.info(f"Internal save path: {actual_output_path_in_container}")
-        logger.info(f"Constructed download URL: {download_url}")
+        # Construct download URL. The filename is percent-encoded so spaces and non-ASCII names give working links;
+        # the file on disk keeps the raw name. The DOWNLOAD_BASE_URL should already contain the necessary prefix like /downloads
+        download_url = f"{_CFG.download_base}/{quote(output_filename_for_url, safe='')}"
+        logger.info("User specified output file: %s", user_specified_output_file)
+        logger.info("Derived output filename for URL/storage: %s", output_filename_for_url)
+        logger.info("Internal save path: %s", actual_output_path_in_container)
+        logger.info("Constructed download URL: %s", download_url)
 
     try:
-        extra_args = []
-        # For PDF conversion, especially with CJK characters, xelatex is better.
-        # Ensure fonts are installed in the Docker image (e.g., Noto Sans CJK or other Chinese fonts)
-        if output_format == "pdf":
-            extra_args.extend([
-                "--pdf-engine=xelatex",
-                "-V", "geometry:margin=1in",
-                # Example: If you have a main CJK font installed and know its name
-                # "-V", "mainfont=Noto Sans CJK SC" # Or your specific font
-                # "-V", "monofont=Noto Sans Mono CJK SC"
-                # "-V", "sansfont=Noto Sans CJK SC"
-            ])
-            # If input is markdown, add CJK support for pandoc's markdown parser
-            if input_format == "markdown":
-                extra_args.append("--from=markdown+east_asian_line_breaks")
-
-        converted_output_string = None
-
-        if input_file_path:
-            if not os.path.exists(input_file_path):
-                raise ValueError(f"Input file not found: {input_file_path}")
-            logger.info(f"Converting from input file: {input_file_path}")
+        if input_file_path and not await asyncio.to_thread(os.path.exists, input_file_path):
+            raise ValueError(f"Input file not found: {input_file_path}")
+        source = await asyncio.to_thread(_read_file_bytes, input_file_path) if input_file_path else contents.encode("utf-8")
+
+        # Input files pandoc must open itself (e.g. docx) are converted by path, with the format
+        # inferred from their extension; everything else is piped from source.
+        piped = not input_file_path or _pipeable_input_file(input_file_path, input_format)
+
+        extra_args = _EXTRA_ARGS.get(output_format, ())
+        # If PDF input is markdown with CJK text, add CJK support for pandoc's markdown parser.
+        # Pure-ASCII input skips the extension and its extra per-line pass.
+        if output_format == "pdf" and input_format == "markdown" and piped and not source.isascii():
+            extra_args += ("--from=markdown+east_asian_line_breaks",)
+
+        # Text from the cache, the pandoc server or the batcher, or pandoc's stdout as bytes.
+        converted_output = None
+        loop = asyncio.get_running_loop()
+
+        if inline:
+            # Hand the document straight back to the client; nothing is written to the shared directory
+            # unless it is too large for the reply.
+            output_bytes = await _convert_to_bytes(source, input_file_path, input_format, output_format, extra_args)
+            if len(output_bytes) > _CFG.inline_limit_bytes:
+                return [types.TextContent(type="text", text=await _save_for_download(output_bytes, output_format))]
+            resource_name = output_filename_for_url or f"converted.{_FILE_EXTENSIONS.get(output_format, output_format)}"
+            logger.info("Returning %s bytes of %s inline as %s", len(output_bytes), output_format, resource_name)
+            return [
+                types.TextContent(
+                    type="text",
+                    text=f"Content successfully converted to {output_format}. The document is attached as '{resource_name}'."
+                ),
+                types.EmbeddedResource(
+                    type="resource",
+                    resource=types.BlobResourceContents(
+                        uri=f"file:///{quote(resource_name)}",
+                        mimeType=mimetypes.guess_type(resource_name)[0] or "application/octet-stream",
+                        blob=base64.b64encode(output_bytes).decode("ascii"),
+                    ),
+                ),
+            ]
+
+        # pandoc picks the reader for an unpiped input file from its extension (case-insensitively),
+        # so that, not input_format, decides how the bytes are read.
+        cache_key = _cache_key(
+            source,
+            input_format if piped else os.path.splitext(input_file_path)[1].lower(),
+            output_format, extra_args, actual_output_path_in_container is not None
+        )
+        cached = await _cache_get(cache_key)
+        cache_path = None
+        if cached is None and actual_output_path_in_container:
+            cache_path = await asyncio.to_thread(_cache_artifact_path, cache_key, actual_output_path_in_container)
+
+        if cached is not None and actual_output_path_in_container:
+            await asyncio.to_thread(_materialize_cached, cached, actual_output_path_in_container)
+            logger.info("Served conversion from cache and saved to: %s", actual_output_path_in_container)
+        elif cached is not None:
+            converted_output = cached
+            logger.info("Served conversion to %s from cache", output_format)
+        elif not piped:
+            logger.info("Converting from input file: %s", input_file_path)
             if actual_output_path_in_container:
-                pypandoc.convert_file(
+                await _pandoc_file_to_file(
                     input_file_path,
                     output_format,
-                    outputfile=actual_output_path_in_container,
-                    extra_args=extra_args
+                    actual_output_path_in_container,
+                    extra_args=extra_args,
+                    cache_path=cache_path
                 )
                 logger.info(
-                    f"File successfully converted from '{input_file_path}' and saved to: {actual_output_path_in_container}")
+                    "File successfully converted from '%s' and saved to: %s",
+                    input_file_path, actual_output_path_in_container)
             else:
-                converted_output_string = pypandoc.convert_file(
-                    input_file_path,
-                    output_format,
-                    extra_args=extra_args
-                )
-        else:  # contents must be provided
-            logger.info(f"Converting from direct content string (input format: {input_format})")
-            if actual_output_path_in_container:
-                pypandoc.convert_text(
-                    contents,
+                async with _CONVERT_SEM:
+                    converted_output = await loop.run_in_executor(_POOL, functools.partial(
+                        _do_convert,
+                        input_file_path,
+                        output_format,
+                        extra_args
+                    ))
+        else:  # contents, or a text input file whose bytes are already in source
+            if input_file_path:
+                logger.info("Converting from input file over stdin: %s", input_file_path)
+            else:
+                logger.info("Converting from direct content string (input format: %s)", input_format)
+            served_output = None
+            if contents and not extra_args:
+                if input_format == output_format and output_format not in _BINARY_OUTPUT_FORMATS:
+                    # Nothing for pandoc to do; hand the contents straight back.
+                    served_output = contents
+                else:
+                    served_output = await _convert_via_pandoc_server(contents, input_format, output_format)
+            if served_output is not None and actual_output_path_in_container:
+                await asyncio.to_thread(_write_output, actual_output_path_in_container, served_output, cache_path)
+                logger.info("Content converted without spawning pandoc and saved to: %s",
+                            actual_output_path_in_container)
+            elif served_output is not None:
+                converted_output = served_output
+            elif actual_output_path_in_container:
+                await _pandoc_pipe(
+                    source,
+                    input_format,
                     output_format,
-                    format=input_format,
                     outputfile=actual_output_path_in_container,
-                    extra_args=extra_args
+                    extra_args=extra_args,
+                    cache_path=cache_path
                 )
-                logger.info(f"Content successfully converted and saved to: {actual_output_path_in_container}")
+                logger.info("Content successfully converted and saved to: %s", actual_output_path_in_container)
+            elif (_batch_queue is not None and contents and not extra_args
+                  and _is_batchable(contents, input_format, output_format)):
+                converted_output = await _convert_text_batched(contents, input_format, output_format)
             else:
-                converted_output_string = pypandoc.convert_text(
-                    contents,
+                converted_output = await _pandoc_pipe(
+                    source,
+                    input_format,
                     output_format,
-                    format=input_format,
                     extra_args=extra_args
                 )
 
+        if actual_output_path_in_container and _CFG.file_ttl_seconds > 0:
+            _owned_outputs.add(actual_output_path_in_container)
+        if isinstance(converted_output, bytes):
+            # pandoc's stdout is only decoded once it is known to fit in the reply; an oversized
+            # result is saved as pandoc wrote it rather than decoded and encoded again.
+            oversized = len(converted_output) > _CFG.inline_limit_bytes
+            if not oversized:
+                converted_output = converted_output.decode("utf-8")
+        else:
+            oversized = (converted_output is not None
+                         and _utf8_len_exceeds(converted_output, _CFG.inline_limit_bytes))
+        if cached is None:
+            if cache_path:
+                await _cache_put(cache_key, cache_path, True)
+            elif converted_output is not None and not oversized:
+                await _cache_put(cache_key, converted_output, False)
+
         if actual_output_path_in_container and download_url:
             notify_with_result = (
                 f"Content successfully converted. "
                 f"Download from: {download_url}\n"
+                f"{_link_lifetime()}\n"
                 f"(Internally saved at: {actual_output_path_in_container})"
             )
-        elif converted_output_string is not None:
-            if not converted_output_string.strip():
-                logger.warning(f"Conversion resulted in empty output for format {output_format}")
+        elif converted_output is not None:
+            if not converted_output.strip():
+                logger.warning("Conversion resulted in empty output for format %s", output_format)
                 notify_with_result = (
                     f"Conversion to {output_format} resulted in empty content. "
                     "This might be expected or indicate an issue (e.g., missing fonts for PDF with CJK)."
                 )
+            elif oversized:
+                # Too large to embed in the reply; save it and hand back a download link instead.
+                notify_with_result = await _save_for_download(converted_output, output_format)
             else:
-                notify_with_result = (
-                    f'Following are the converted contents in {output_format} format.\n'
-                    f'If you want to save this as a file and get a download link, '
-                    f'please provide the `output_file` parameter with a complete path (e.g., "/path/to/my_document.{output_format}").\n\n'
-                    f'Converted Contents:\n\n{converted_output_string}'
-                )
+                # The converted text goes out as its own item so it is not copied into a combined string.
+                return [
+                    types.TextContent(type="text", text=(
+                        f'Following are the converted contents in {output_format} format.\n'
+                        f'If you want to save this as a file and get a download link, '
+                        f'please provide the `output_file` parameter with a complete path (e.g., "/path/to/my_document.{output_format}").\n\n'
+                        f'Converted Contents:'
+                    )),
+                    types.TextContent(type="text", text=converted_output),
+                ]
         else:
             raise ValueError("Conversion process completed but no output (file or string) was generated.")
 
@@ -295,43 +1212,40 @@ async def handle_call_tool(
         raise ValueError(error_msg)
 
 
+def event_loop_factory():
+    """Returns uvloop.new_event_loop when uvloop is available, else None for asyncio's default loop.
+
+    The result is meant for asyncio.Runner(loop_factory=...); uvloop.install() goes through the
+    event loop policy API, which is deprecated from Python 3.12 (uvloop) and 3.14 (asyncio).
+
+    uvloop does not implement loop.sendfile(), so with it aiohttp's FileResponse serves
+    downloads through its chunked read/write fallback instead of zero-copy sendfile().
+    """
+    try:
+        import uvloop
+    except ImportError:
+        logger.info("uvloop not installed; using the default asyncio event loop.")
+        return None
+    logger.info("Using uvloop event loop; downloads are streamed without sendfile().")
+    return uvloop.new_event_loop
+
+
 async def main():
+    global _batch_queue
+    logger.info("MCP Pandoc Server starting up...")
     http_app = web.Application()
 
-    # Determine the route prefix for serving static files from DOWNLOAD_BASE_URL
-    # Example: DOWNLOAD_BASE_URL = "http://172.191.18.52:8087/downloads"
-    # parsed_base_url.path will be "/downloads"
-    # This path is what aiohttp will use as its route prefix.
-    parsed_base_url = urlparse(DOWNLOAD_BASE_URL)
-    http_server_route_prefix = parsed_base_url.path.rstrip('/')
-    if not http_server_route_prefix:  # If DOWNLOAD_BASE_URL is like http://host:port (no path)
-        # This case means files are served at the root of the HTTP server.
-        # The download link would be http://host:port/filename.pdf
-        # And aiohttp serves SHARED_DOWNLOAD_INTERNAL_PATH at '/'
-        http_server_route_prefix = '/'
-        logger.warning(
-            "DOWNLOAD_BASE_URL does not specify a path prefix (e.g., /downloads). "
-            "Files will be served from HTTP server root. "
-            f"Ensure '{DOWNLOAD_BASE_URL}' is accessible and correctly points to where files will be."
-        )
-    else:
-        logger.info(f"HTTP server will serve files under the route prefix: '{http_server_route_prefix}'")
-
-    # Setup static file serving
-    # Files in SHARED_DOWNLOAD_INTERNAL_PATH will be accessible via:
-    # <protocol>://<host>:<port><http_server_route_prefix>/<filename>
-    # This must match the structure of DOWNLOAD_BASE_URL
-    http_app.router.add_static(
-        prefix=http_server_route_prefix,
-        path=SHARED_DOWNLOAD_INTERNAL_PATH,
-        show_index=True,  # Helpful for debugging, list files if index.html not found
-        follow_symlinks=True  # Be cautious with symlinks if any are used
-    )
+    http_app.router.add_get(_DOWNLOAD_ROUTE, serve_download)
     logger.info(
-        f"aiohttp static route configured: prefix='{http_server_route_prefix}', path='{SHARED_DOWNLOAD_INTERNAL_PATH}'")
+        "aiohttp download route configured: route='%s', path='%s'",
+        _DOWNLOAD_ROUTE, _CFG.shared_dir)
 
     app_runner = web.AppRunner(http_app)
     http_server_task = asyncio.create_task(start_http_server(app_runner))
+    _batch_queue = asyncio.Queue()
+    batch_task = asyncio.create_task(_batch_coalescer())
+    await start_pandoc_server()
+    gc_task = asyncio.create_task(_gc_loop())
 
     try:
         async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
@@ -348,9 +1262,13 @@ async def main():
                 ),
             )
     except Exception as e:
-        logger.critical(f"MCP server run failed: {e}", exc_info=True)
+        logger.critical("MCP server run failed: %s", e, exc_info=True)
     finally:
         logger.info("MCP Pandoc Server shutting down...")
+        batch_task.cancel()
+        gc_task.cancel()
+        _batch_queue = None
+        await stop_pandoc_server()
         await cleanup_http_server(app_runner)
         if http_server_task and not http_server_task.done():
             http_server_task.cancel()
@@ -359,14 +1277,16 @@ async def main():
             except asyncio.CancelledError:
                 logger.info("HTTP server task successfully cancelled.")
             except Exception as e_cancel:
-                logger.error(f"Error during HTTP server task cancellation: {e_cancel}", exc_info=True)
+                logger.error("Error during HTTP server task cancellation: %s", e_cancel, exc_info=True)
+        _POOL.shutdown(wait=False, cancel_futures=True)
         logger.info("Shutdown complete.")
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        with asyncio.Runner(loop_factory=event_loop_factory()) as runner:
+            runner.run(main())
     except KeyboardInterrupt:
         logger.info("Process interrupted by user (KeyboardInterrupt).")
     except Exception as e_global:
-        logger.critical(f"Unhandled exception in __main__: {e_global}", exc_info=True)
+        logger.critical("Unhandled exception in __main__: %s", e_global, exc_info=True)
@@ -0,0 +1,15 @@
+import dataclasses
+
+import pytest
+
+from mcp_pandoc import server
+
+
+@pytest.fixture
+def shared_dir(tmp_path, monkeypatch):
+    """Points the server at an empty shared directory with a fresh conversion cache."""
+    monkeypatch.setattr(server, "_CFG", dataclasses.replace(server._CFG, shared_dir=str(tmp_path)))
+    monkeypatch.setattr(server, "_CACHE_DIR", str(tmp_path / ".cache"))
+    monkeypatch.setattr(server, "_conversion_cache", type(server._conversion_cache)())
+    monkeypatch.setattr(server, "_owned_outputs", set())
+    return tmp_path
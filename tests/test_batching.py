@@ -0,0 +1,127 @@
+"""Tests for the string-mode batch coalescer in mcp_pandoc.server."""
+import asyncio
+import shutil
+
+import pytest
+
+from mcp_pandoc import server
+
+
+def _fake_pipe(calls, keep_sentinel=True):
+    """A stand-in for _pandoc_pipe that upper-cases its input and records each call."""
+    async def pipe(contents, input_format, output_format, outputfile=None, extra_args=()):
+        text = contents.decode("utf-8")
+        calls.append(text)
+        if not keep_sentinel:
+            text = text.replace(server._BATCH_SENTINEL, "")
+        return text.upper().replace(server._BATCH_SENTINEL.upper(), server._BATCH_SENTINEL).encode("utf-8")
+    return pipe
+
+
+async def _run_items(documents, key=("markdown", "html")):
+    loop = asyncio.get_running_loop()
+    items = [(document, loop.create_future()) for document in documents]
+    await server._run_batch(key, items)
+    return [future for _, future in items]
+
+
+@pytest.mark.parametrize("contents", [
+    "# Heading\n",
+    "Setext heading\n===\n",
+    "[ref]: https://example.com\n",
+    "Text[^1]\n\n[^1]: A footnote.\n",
+    "Text^[an inline note] here\n",
+    "(@) First example\n",
+    "As shown in (@good).\n",
+    "% Title block\n",
+    "\\newcommand{\\tuple}[1]{\\langle #1 \\rangle}\n",
+    "---\ntitle: metadata\n---\n",
+    "An unclosed <!-- comment\n",
+    "A closed <!-- comment -->\n",
+])
+def test_document_wide_constructs_are_not_batchable(contents):
+    assert not server._is_batchable(contents, "markdown", "html")
+
+
+def test_plain_markdown_is_batchable():
+    assert server._is_batchable("Some *emphasis*, a [link](https://example.com) and 50% off.\n", "markdown", "html")
+    assert not server._is_batchable("Plain text\n", "markdown", "rst")
+    assert not server._is_batchable("Plain text\n", "markdown", "markdown")
+    assert not server._is_batchable(f"Text {server._BATCH_SENTINEL}\n", "markdown", "html")
+
+
+def test_batch_is_split_back_per_document(monkeypatch):
+    calls = []
+    monkeypatch.setattr(server, "_pandoc_pipe", _fake_pipe(calls))
+
+    futures = asyncio.run(_run_items(["first\n", "second\n", "third\n"]))
+
+    assert len(calls) == 1
+    assert [future.result() for future in futures] == ["FIRST\n", "SECOND\n", "THIRD\n"]
+
+
+def test_mismatched_split_falls_back_to_individual_runs(monkeypatch):
+    calls = []
+    monkeypatch.setattr(server, "_pandoc_pipe", _fake_pipe(calls, keep_sentinel=False))
+
+    futures = asyncio.run(_run_items(["first\n", "second\n"]))
+
+    # One batched run whose separator was lost, then one run per document.
+    assert calls[1:] == ["first\n", "second\n"]
+    assert [future.result() for future in futures] == ["FIRST\n", "SECOND\n"]
+
+
+def test_pandoc_failure_is_raised_to_every_caller(monkeypatch):
+    async def failing_pipe(*args, **kwargs):
+        raise RuntimeError("pandoc failed")
+    monkeypatch.setattr(server, "_pandoc_pipe", failing_pipe)
+
+    futures = asyncio.run(_run_items(["first\n", "second\n"]))
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="pandoc failed"):
+            future.result()
+
+
+def test_coalescer_groups_concurrent_requests(monkeypatch):
+    calls = []
+    monkeypatch.setattr(server, "_pandoc_pipe", _fake_pipe(calls))
+
+    async def convert_concurrently():
+        monkeypatch.setattr(server, "_batch_queue", asyncio.Queue())
+        coalescer = asyncio.create_task(server._batch_coalescer())
+        try:
+            return await asyncio.gather(
+                server._convert_text_batched("one\n", "markdown", "html"),
+                server._convert_text_batched("two\n", "markdown", "html"),
+                server._convert_text_batched("three\n", "html", "html"),
+            )
+        finally:
+            coalescer.cancel()
+
+    results = asyncio.run(convert_concurrently())
+
+    assert results == ["ONE\n", "TWO\n", "THREE\n"]
+    assert len(calls) == 2  # one run per (input, output) format pair
+    assert not server._batch_tasks
+
+
+@pytest.mark.skipif(shutil.which("pandoc") is None, reason="pandoc is not installed")
+def test_batched_output_matches_individual_conversions():
+    documents = [
+        "Some *emphasis* and a [link](https://example.com).\n",
+        "- a list\n- with items\n",
+        "A paragraph with `code` and **strong** text.\n",
+    ]
+
+    async def convert():
+        batched = await _run_items(documents)
+        individual = [
+            (await server._pandoc_pipe(document.encode("utf-8"), "markdown", "html")).decode("utf-8")
+            for document in documents
+        ]
+        return [future.result() for future in batched], individual
+
+    batched, individual = asyncio.run(convert())
+
+    assert batched == individual
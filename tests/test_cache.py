@@ -0,0 +1,98 @@
+"""Tests for the conversion cache in mcp_pandoc.server."""
+import asyncio
+import dataclasses
+import os
+
+from mcp_pandoc import server
+
+
+def _fake_file_to_file(calls):
+    """A stand-in for _pandoc_file_to_file that writes the reader pandoc would infer."""
+    async def file_to_file(input_file_path, output_format, outputfile, extra_args=(), cache_path=None):
+        calls.append(input_file_path)
+        reader = os.path.splitext(input_file_path)[1]
+        await asyncio.to_thread(server._write_output, outputfile, f"{output_format} read as {reader}\n", cache_path)
+    return file_to_file
+
+
+def _convert(**arguments):
+    return asyncio.run(server._convert_one(arguments))
+
+
+def test_unpiped_input_files_are_cached_per_extension(shared_dir, tmp_path_factory, monkeypatch):
+    calls = []
+    monkeypatch.setattr(server, "_pandoc_file_to_file", _fake_file_to_file(calls))
+    inputs = tmp_path_factory.mktemp("inputs")
+    for name in ("doc.rst", "doc.txt"):
+        (inputs / name).write_text("Same bytes\n")
+
+    _convert(input_file=str(inputs / "doc.rst"), output_format="latex", output_file="out-rst.tex")
+    _convert(input_file=str(inputs / "doc.txt"), output_format="latex", output_file="out-txt.tex")
+    _convert(input_file=str(inputs / "doc.txt"), output_format="latex", output_file="out-txt-again.tex")
+
+    assert calls == [str(inputs / "doc.rst"), str(inputs / "doc.txt")]
+    assert (shared_dir / "out-rst.tex").read_text() == "latex read as .rst\n"
+    assert (shared_dir / "out-txt.tex").read_text() == "latex read as .txt\n"
+    assert (shared_dir / "out-txt-again.tex").read_text() == "latex read as .txt\n"
+
+
+def test_cache_keeps_this_conversions_file_when_the_output_is_replaced(shared_dir, monkeypatch):
+    write_output = server._write_output
+
+    def write_then_race(path, data, cache_path=None):
+        write_output(path, data, cache_path)
+        # A concurrent conversion to the same filename publishes its own document right after.
+        write_output(path, "Document B\n")
+
+    monkeypatch.setattr(server, "_write_output", write_then_race)
+    _convert(contents="Document A\n", output_file="shared.md")
+    monkeypatch.setattr(server, "_write_output", write_output)
+
+    _convert(contents="Document A\n", output_file="copy.md")
+
+    assert (shared_dir / "copy.md").read_text() == "Document A\n"
+
+
+def test_string_results_are_served_from_cache(shared_dir, monkeypatch):
+    calls = []
+
+    async def pipe(contents, input_format, output_format, outputfile=None, extra_args=(), cache_path=None):
+        calls.append(contents)
+        return contents.upper()
+
+    monkeypatch.setattr(server, "_pandoc_pipe", pipe)
+    monkeypatch.setattr(server, "_batch_queue", None)
+
+    first = _convert(contents="hello\n", output_format="html")
+    second = _convert(contents="hello\n", output_format="html")
+
+    assert len(calls) == 1
+    assert first[-1].text == second[-1].text == "HELLO\n"
+
+
+def test_least_recently_used_entries_are_evicted(shared_dir, monkeypatch):
+    monkeypatch.setattr(server, "_CFG", dataclasses.replace(server._CFG, cache_size=2))
+    artifact = shared_dir / "artifact.md"
+    artifact.write_text("cached\n")
+    asyncio.run(server._cache_put("file", str(artifact), True))
+    asyncio.run(server._cache_put("a", "A", False))
+    assert asyncio.run(server._cache_get("file")) == str(artifact)
+
+    asyncio.run(server._cache_put("b", "B", False))
+
+    assert asyncio.run(server._cache_get("a")) is None
+    assert asyncio.run(server._cache_get("file")) == str(artifact)
+    asyncio.run(server._cache_put("c", "C", False))
+    asyncio.run(server._cache_put("d", "D", False))
+    assert asyncio.run(server._cache_get("file")) is None
+    assert not artifact.exists()
+
+
+def test_entries_whose_artifact_was_swept_are_dropped(shared_dir):
+    artifact = shared_dir / "artifact.md"
+    artifact.write_text("cached\n")
+    asyncio.run(server._cache_put("file", str(artifact), True))
+    artifact.unlink()
+
+    assert asyncio.run(server._cache_get("file")) is None
+    assert "file" not in server._conversion_cache
@@ -0,0 +1,78 @@
+"""Tests for the replies of the convert-contents tool in mcp_pandoc.server."""
+import asyncio
+import dataclasses
+import shutil
+
+import pytest
+
+from mcp_pandoc import server
+
+
+def _convert(**arguments):
+    return asyncio.run(server._convert_one(arguments))
+
+
+def test_download_replies_say_how_long_the_link_works(shared_dir, monkeypatch):
+    monkeypatch.setattr(server, "_CFG", dataclasses.replace(server._CFG, file_ttl_seconds=7200))
+
+    reply = _convert(contents="text\n", output_file="out.md")
+
+    assert "Download from:" in reply[0].text
+    assert "The link stays valid for 2 hours" in reply[0].text
+
+
+def test_inline_documents_are_attached(shared_dir, monkeypatch):
+    async def to_bytes(source, input_file_path, input_format, output_format, extra_args):
+        return b"PK small docx"
+    monkeypatch.setattr(server, "_convert_to_bytes", to_bytes)
+
+    reply = _convert(contents="text\n", output_format="docx", output_file="story.docx", inline=True)
+
+    assert reply[1].resource.blob == "UEsgc21hbGwgZG9jeA=="
+    assert str(reply[1].resource.uri).endswith("story.docx")
+    assert list(shared_dir.iterdir()) == []
+
+
+def test_inline_documents_over_the_limit_become_a_download(shared_dir, monkeypatch):
+    monkeypatch.setattr(server, "_CFG", dataclasses.replace(server._CFG, inline_limit_bytes=8))
+
+    async def to_bytes(source, input_file_path, input_format, output_format, extra_args):
+        return b"PK a docx that is too large"
+    monkeypatch.setattr(server, "_convert_to_bytes", to_bytes)
+
+    reply = _convert(contents="text\n", output_format="docx", inline=True)
+
+    assert len(reply) == 1
+    assert "too large to return directly. Download from:" in reply[0].text
+    [saved] = shared_dir.iterdir()
+    assert saved.suffix == ".docx"
+    assert saved.read_bytes() == b"PK a docx that is too large"
+
+
+def test_oversized_pandoc_output_is_saved_as_pandoc_wrote_it(shared_dir, monkeypatch):
+    monkeypatch.setattr(server, "_CFG", dataclasses.replace(server._CFG, inline_limit_bytes=8))
+    monkeypatch.setattr(server, "_batch_queue", None)
+    # Not valid UTF-8: saving it only works if the bytes are never decoded.
+    output = b"<p>\xff large output</p>\n"
+
+    async def pipe(contents, input_format, output_format, outputfile=None, extra_args=(), cache_path=None):
+        return output
+    monkeypatch.setattr(server, "_pandoc_pipe", pipe)
+
+    reply = _convert(contents="text\n", output_format="html")
+
+    assert f"({len(output)} bytes) is too large to return directly" in reply[0].text
+    [saved] = shared_dir.iterdir()
+    assert saved.read_bytes() == output
+
+
+def test_input_files_converted_in_the_pool_return_text(shared_dir, tmp_path_factory):
+    if shutil.which("pandoc") is None:
+        pytest.skip("pandoc is not installed")
+    source = tmp_path_factory.mktemp("inputs") / "doc.rst"
+    source.write_text("Some *emphasis*.\n")
+
+    # input_format does not match the extension, so pandoc opens the file itself in a pool worker.
+    reply = _convert(input_file=str(source), input_format="markdown", output_format="html")
+
+    assert reply[-1].text == "<p>Some <em>emphasis</em>.</p>\n"
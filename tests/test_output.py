@@ -0,0 +1,69 @@
+"""Tests for the atomic output writers in mcp_pandoc.server."""
+import asyncio
+import os
+import sys
+
+import pytest
+
+from mcp_pandoc import server
+
+# Writes its first argument to the path after -o, then exits with its second argument.
+_FAKE_PANDOC = "import sys; open(sys.argv[-1], 'w').write(sys.argv[1]); sys.exit(int(sys.argv[2]))"
+
+
+@pytest.fixture(params=["O_TMPFILE", "sibling"])
+def tmpfile_mode(request, monkeypatch):
+    """Runs a test with O_TMPFILE outputs and with the hidden sibling fallback."""
+    if request.param == "sibling":
+        monkeypatch.setattr(server, "_open_output_tmpfile", lambda path: None)
+    elif server._open_output_tmpfile(os.getcwd()) is None:
+        pytest.skip("O_TMPFILE is not available")
+    return request.param
+
+
+def _run_fake_pandoc(text, exitcode, outputfile, cache_path=None):
+    argv = [sys.executable, "-c", _FAKE_PANDOC, text, str(exitcode)]
+    return asyncio.run(server._run_pandoc(argv, outputfile=outputfile, cache_path=cache_path))
+
+
+def test_write_output_replaces_the_file(tmp_path, tmpfile_mode):
+    path = tmp_path / "out.md"
+    path.write_text("old\n")
+
+    server._write_output(str(path), "new\n")
+
+    assert path.read_text() == "new\n"
+    assert os.listdir(tmp_path) == ["out.md"]
+
+
+def test_write_output_links_the_cache_path(tmp_path, tmpfile_mode):
+    path = tmp_path / "out.md"
+    cache_path = tmp_path / "cached.md"
+
+    server._write_output(str(path), b"bytes\n", str(cache_path))
+    server._write_output(str(path), "replaced\n")
+
+    assert cache_path.read_text() == "bytes\n"
+    assert path.read_text() == "replaced\n"
+
+
+def test_pandoc_output_is_published_on_success(tmp_path, tmpfile_mode):
+    path = tmp_path / "out.html"
+    cache_path = tmp_path / "cached.html"
+    path.write_text("old\n")
+
+    _run_fake_pandoc("new\n", 0, str(path), str(cache_path))
+
+    assert path.read_text() == cache_path.read_text() == "new\n"
+    assert sorted(os.listdir(tmp_path)) == ["cached.html", "out.html"]
+
+
+def test_failed_pandoc_run_keeps_the_previous_file(tmp_path, tmpfile_mode):
+    path = tmp_path / "out.html"
+    path.write_text("old\n")
+
+    with pytest.raises(RuntimeError, match="exitcode"):
+        _run_fake_pandoc("partial", 1, str(path))
+
+    assert path.read_text() == "old\n"
+    assert os.listdir(tmp_path) == ["out.html"]
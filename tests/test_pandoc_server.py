@@ -0,0 +1,55 @@
+"""Tests for routing conversions to the long-running pandoc server in mcp_pandoc.server."""
+import asyncio
+import types
+
+import pytest
+
+from mcp_pandoc import server
+
+
+class _RecordingSession:
+    """A stand-in for the aiohttp session that records posts and answers like pandoc server."""
+
+    def __init__(self):
+        self.payloads = []
+
+    def post(self, url, json, headers):
+        self.payloads.append(json)
+        session = self
+
+        class Response:
+            status = 200
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def json(self):
+                return {"output": session.payloads[-1]["text"].upper()}
+
+        return Response()
+
+
+@pytest.fixture
+def pandoc_server(monkeypatch):
+    session = _RecordingSession()
+    monkeypatch.setattr(server, "_pandoc_session", session)
+    monkeypatch.setattr(server, "_pandoc_server_proc", types.SimpleNamespace(returncode=None))
+    return session
+
+
+def test_text_formats_go_to_the_server(pandoc_server):
+    output = asyncio.run(server._convert_via_pandoc_server("text", "markdown", "html"))
+
+    assert output == "TEXT"
+    assert pandoc_server.payloads == [{"text": "text", "from": "markdown", "to": "html"}]
+
+
+@pytest.mark.parametrize("output_format", ["docx", "epub", "pdf"])
+def test_formats_needing_file_access_run_pandoc_itself(pandoc_server, output_format):
+    contents = "![diagram](images/diagram.png)\n"
+
+    assert asyncio.run(server._convert_via_pandoc_server(contents, "markdown", output_format)) is None
+    assert pandoc_server.payloads == []
@@ -0,0 +1,39 @@
+"""Tests for the shared-directory sweeper in mcp_pandoc.server."""
+import asyncio
+import dataclasses
+import os
+import time
+
+from mcp_pandoc import server
+
+
+def _file(path, age):
+    path.parent.mkdir(exist_ok=True)
+    path.write_text("x")
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_only_expired_files_written_by_the_server_are_removed(shared_dir):
+    owned = _file(shared_dir / "report.pdf", 7200)
+    spill = _file(shared_dir / "converted-0123456789ab.html", 7200)
+    tmp = _file(shared_dir / ".0123456789ab.tmp.pdf", 7200)
+    artifact = _file(shared_dir / ".cache" / ("ab" * 64 + ".pdf"), 7200)
+    foreign = _file(shared_dir / "notes.txt", 7200)
+    fresh = _file(shared_dir / "converted-ba9876543210.html", 10)
+
+    removed = server._sweep_shared_dir(frozenset({owned}))
+
+    assert sorted(removed) == sorted([owned, spill, tmp, artifact])
+    assert os.path.exists(foreign)
+    assert os.path.exists(fresh)
+
+
+def test_sweeper_is_disabled_without_a_positive_ttl(shared_dir, monkeypatch):
+    monkeypatch.setattr(server, "_CFG", dataclasses.replace(server._CFG, file_ttl_seconds=0))
+    spill = _file(shared_dir / "converted-0123456789ab.html", 7200)
+
+    asyncio.run(asyncio.wait_for(server._gc_loop(), 1))
+
+    assert os.path.exists(spill)
@@ -0,0 +1,31 @@
+"""Tests for tool argument validation in mcp_pandoc.server."""
+import pytest
+
+from mcp_pandoc import server
+
+
+def test_valid_arguments_pass():
+    server._validate_arguments({
+        "contents": "text",
+        "input_format": "Markdown",
+        "output_format": "pdf",
+        "output_file": "/tmp/out.pdf",
+        "inline": False,
+        "inputs": [{"contents": "more"}],
+    })
+
+
+def test_null_and_unknown_arguments_are_ignored():
+    server._validate_arguments({"output_file": None, "inline": None, "output_format": None, "extra": 1})
+
+
+@pytest.mark.parametrize("arguments, message", [
+    ({"contents": 1}, "'contents' must be of type str"),
+    ({"inline": "yes"}, "'inline' must be of type bool"),
+    ({"inputs": {"contents": "x"}}, "'inputs' must be of type list"),
+    ({"output_format": "odt"}, "Unsupported output format: 'odt'"),
+    ({"input_format": "doc"}, "Unsupported input format: 'doc'"),
+])
+def test_invalid_arguments_are_rejected(arguments, message):
+    with pytest.raises(ValueError, match=message):
+        server._validate_arguments(arguments)